@@ -1,19 +1,39 @@
+import csv
+import functools
+import hashlib
+import hmac
+import io
+import json
 import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+import click
 from flask import (
     Flask,
+    Response,
+    make_response,
     render_template,
     request,
     redirect,
+    abort,
     url_for,
     session,
     flash,
     send_from_directory,
+    stream_with_context,
+    g,
 )
 
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.security import check_password_hash
 from werkzeug.utils import secure_filename
 
 # -----------------------------------------------------------------------------
@@ -24,6 +44,9 @@ DB_PATH = BASE_DIR / "trades.db"
 UPLOAD_FOLDER = BASE_DIR / "static" / "uploads"
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 
+# tulis file upload di background, request tidak menunggu disk
+_upload_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="upload")
+
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.environ.get("APP_SECRET_KEY", "dev-secret-key-banu")
 app.config["UPLOAD_FOLDER"] = str(UPLOAD_FOLDER)
@@ -31,66 +54,429 @@ app.config["UPLOAD_FOLDER"] = str(UPLOAD_FOLDER)
 # admin credential (bisa di-set di Railway env)
 ADMIN_USERNAME = os.environ.get("APP_ADMIN_USER", "banu")
 ADMIN_PASSWORD = os.environ.get("APP_ADMIN_PASS", "Banu22")
+# opsional: hash yang sudah di-generate sekali, tidak di-hash ulang tiap worker start
+#   python -c "from werkzeug.security import generate_password_hash as g; print(g('...'))"
+ADMIN_PASSWORD_HASH = os.environ.get("APP_ADMIN_PASS_HASH")
+
+# cache dashboard in-process: valid selama trades_version di db sama & umur < TTL
+DASHBOARD_CACHE_TTL = 60
+_dashboard_lock = threading.Lock()
+_dashboard_cache = {"version": -1, "ts": 0.0, "stats": None}
+
+# HTML hasil render public page / trade detail, per trades_version
+PAGE_CACHE_MAX = 256
+_page_cache_lock = threading.Lock()
+_page_cache = {"version": -1, "pages": {}}
+
+# jumlah baris per halaman tabel trade (public & owner)
+TRADES_PER_PAGE = 50
 
 
 # -----------------------------------------------------------------------------
 # db util
 # -----------------------------------------------------------------------------
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+def connect_db():
+    """
+    Koneksi autocommit (isolation_level=None): transaksi write selalu dibuka
+    eksplisit dengan BEGIN IMMEDIATE.
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    # aman di mode WAL, commit tidak fsync tiap transaksi
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA mmap_size=268435456")
     return conn
 
 
+# pool koneksi per proses: dibuka sekali, dipakai ulang antar request
+DB_POOL_SIZE = 5
+# detik menunggu slot pool sebelum request dijawab 503
+DB_POOL_TIMEOUT = 10
+_db_pool = queue.LifoQueue()
+_db_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+
+def _acquire_db():
+    # tunggu kalau semua koneksi sedang dipakai, tapi tidak selamanya
+    if not _db_pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        abort(503)
+    try:
+        try:
+            return _db_pool.get_nowait()
+        except queue.Empty:
+            return connect_db()
+    except BaseException:
+        # gagal buka koneksi -> slot dikembalikan, pool tidak menyusut
+        _db_pool_slots.release()
+        raise
+
+
+def _release_db(conn):
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except BaseException:
+        # rollback gagal -> koneksi tidak layak dipakai ulang, buang saja
+        conn.close()
+        raise
+    else:
+        _db_pool.put(conn)
+    finally:
+        _db_pool_slots.release()
+
+
+def get_db():
+    """
+    Satu koneksi dari pool per request (disimpan di flask.g),
+    dikembalikan ke pool di teardown.
+    """
+    if "db" not in g:
+        g.db = _acquire_db()
+    return g.db
+
+
+def tuple_cursor(conn):
+    """
+    Cursor yang return tuple biasa (bukan sqlite3.Row), untuk loop panjang
+    yang cukup unpack kolom per posisi.
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur
+
+
+# satu writer per proses: thread lain antri di lock ini (tanpa polling),
+# bukan berebut write lock SQLite lewat busy timeout
+_write_lock = threading.Lock()
+
+
+@contextmanager
+def write_transaction(conn):
+    """
+    Transaksi write: BEGIN IMMEDIATE di bawah _write_lock, commit saat keluar
+    block (rollback kalau error). Yield cursor.
+    """
+    with _write_lock, conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        yield cur
+
+
+@app.teardown_appcontext
+def release_db(exc=None):
+    conn = g.pop("db", None)
+    if conn is not None:
+        _release_db(conn)
+
+
+# naikkan setiap ada perubahan di init_db (tabel / index / migrasi data)
+SCHEMA_VERSION = 2
+
+# rr_ratio / result_r / discipline_score dihitung SQLite dari kolom lain
+# (STORED: dihitung sekali saat write, read tetap murah), jadi app tidak
+# perlu hitung + tulis sendiri dan nilainya tidak bisa drift.
+TRADES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS trades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trade_date TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        timeframe TEXT,
+        direction TEXT,
+        entry_price REAL,
+        stop_loss REAL,
+        take_profit REAL,
+        risk_percent REAL,
+        result TEXT,
+        grade TEXT,
+        strategy_tag TEXT,
+        market_condition TEXT,
+        status TEXT,
+        followed_plan INTEGER DEFAULT 0,
+        no_revenge INTEGER DEFAULT 0,
+        no_fomo INTEGER DEFAULT 0,
+        respected_rr INTEGER DEFAULT 0,
+        featured INTEGER DEFAULT 0,
+        notes_public TEXT,
+        notes_private TEXT,
+        screenshot_before TEXT,
+        screenshot_after TEXT,
+        -- reward / risk, 2 desimal; harga kosong / bukan angka / SL = entry -> NULL.
+        -- ROUND SQLite membulatkan .5 ke atas (0.125 -> 0.13), beda dengan
+        -- round() Python dulu (0.125 -> 0.12); migrasi v2 ikut menghitung ulang.
+        rr_ratio REAL GENERATED ALWAYS AS (
+            CASE
+                WHEN typeof(entry_price) IN ('integer', 'real')
+                 AND typeof(stop_loss) IN ('integer', 'real')
+                 AND typeof(take_profit) IN ('integer', 'real')
+                 AND entry_price <> stop_loss
+                THEN ROUND(
+                    ABS(take_profit - entry_price) / ABS(entry_price - stop_loss), 2
+                )
+            END
+        ) STORED,
+        -- WIN => +R, LOSE => -1R, BE => 0
+        result_r REAL GENERATED ALWAYS AS (
+            CASE
+                WHEN rr_ratio IS NULL THEN NULL
+                WHEN result = 'WIN' THEN rr_ratio
+                WHEN result = 'LOSE' THEN -1.0
+                WHEN result = 'BE' THEN 0.0
+            END
+        ) STORED,
+        -- 4 checklist -> 25 / 50 / 75 / 100, semua kosong -> NULL
+        discipline_score REAL GENERATED ALWAYS AS (
+            NULLIF(
+                (followed_plan <> 0) + (no_revenge <> 0)
+                + (no_fomo <> 0) + (respected_rr <> 0),
+                0
+            ) * 25.0
+        ) STORED,
+        created_at TEXT,
+        updated_at TEXT
+    )
+"""
+
+# kolom trades yang ditulis app (semua selain generated column)
+TRADES_STORED_COLUMNS = (
+    "id, trade_date, symbol, timeframe, direction,"
+    " entry_price, stop_loss, take_profit, risk_percent, result, grade,"
+    " strategy_tag, market_condition, status,"
+    " followed_plan, no_revenge, no_fomo, respected_rr, featured,"
+    " notes_public, notes_private, screenshot_before, screenshot_after,"
+    " created_at, updated_at"
+)
+
+
+def _metrics_are_generated(cur) -> bool:
+    # table_xinfo.hidden: 2 = generated VIRTUAL, 3 = generated STORED
+    cur.execute("PRAGMA table_xinfo(trades)")
+    hidden = {row["name"]: row["hidden"] for row in cur.fetchall()}
+    return hidden.get("rr_ratio") in (2, 3)
+
+
+def _rebuild_trades_table(cur):
+    """Pindahkan data ke tabel trades schema terbaru (di dalam transaksi init_db)."""
+    cur.execute("ALTER TABLE trades RENAME TO trades_old")
+    cur.execute(TRADES_TABLE_SQL)
+    cur.execute(
+        f"INSERT INTO trades ({TRADES_STORED_COLUMNS})"
+        f" SELECT {TRADES_STORED_COLUMNS} FROM trades_old"
+    )
+    # id yang pernah dipakai (termasuk yang sudah dihapus) tetap tidak dipakai ulang
+    cur.execute(
+        """
+        UPDATE sqlite_sequence
+        SET seq = (SELECT seq FROM sqlite_sequence WHERE name = 'trades_old')
+        WHERE name = 'trades'
+        """
+    )
+    # index lama ikut ter-drop, dibuat ulang di init_db
+    cur.execute("DROP TABLE trades_old")
+
+
 def init_db():
-    conn = get_db()
+    """
+    Buat / migrasi schema (idempotent). Jalan lewat `flask init-db`, atau
+    otomatis saat start kalau schema di file db belum versi terbaru.
+    """
+    conn = connect_db()
     cur = conn.cursor()
 
+    # WAL: reader tidak nge-block writer (setting persisten di file db)
+    cur.execute("PRAGMA journal_mode=WAL")
+
+    cur.execute("BEGIN IMMEDIATE")
+
+    cur.execute(TRADES_TABLE_SQL)
+
+    # schema v2: metrics jadi generated column. Kolom biasa tidak bisa di-ALTER
+    # jadi generated, jadi tabel lama di-rebuild sekali.
+    if not _metrics_are_generated(cur):
+        _rebuild_trades_table(cur)
+
+    # dashboard baca urut (trade_date, id)
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_trades_date_id ON trades(trade_date, id)"
+    )
+    # export CSV / equity curve: status = ? lalu urut tanggal -> range scan tanpa sort.
+    # result ikut di index supaya filter WIN/LOSE/BE dicek tanpa baca baris.
+    # (result_r generated column: SQLite tetap baca baris, jadi tidak ikut.)
+    # prefix (status) juga menggantikan index status lama.
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_trades_status_date_result"
+        " ON trades(status, trade_date, id, result)"
+    )
+    cur.execute("DROP INDEX IF EXISTS idx_trades_status_date_cover")
+    cur.execute("DROP INDEX IF EXISTS idx_trades_status_date")
+    cur.execute("DROP INDEX IF EXISTS idx_trades_status")
+
+    # one-shot migration: data lama yang belum uppercase
+    cur.execute(
+        """
+        UPDATE trades
+        SET direction = NULLIF(UPPER(TRIM(direction)), ''),
+            result = NULLIF(UPPER(TRIM(result)), ''),
+            status = NULLIF(UPPER(TRIM(status)), ''),
+            strategy_tag = NULLIF(UPPER(TRIM(strategy_tag)), '')
+        WHERE direction IS NOT NULLIF(UPPER(TRIM(direction)), '')
+           OR result IS NOT NULLIF(UPPER(TRIM(result)), '')
+           OR status IS NOT NULLIF(UPPER(TRIM(status)), '')
+           OR strategy_tag IS NOT NULLIF(UPPER(TRIM(strategy_tag)), '')
+        """
+    )
+
+    # agregat dashboard per (status, result), di-update incremental tiap write
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS trades (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            trade_date TEXT NOT NULL,
-            symbol TEXT NOT NULL,
-            timeframe TEXT,
-            direction TEXT,
-            entry_price REAL,
-            stop_loss REAL,
-            take_profit REAL,
-            risk_percent REAL,
-            result TEXT,
-            grade TEXT,
-            strategy_tag TEXT,
-            market_condition TEXT,
-            status TEXT,
-            followed_plan INTEGER DEFAULT 0,
-            no_revenge INTEGER DEFAULT 0,
-            no_fomo INTEGER DEFAULT 0,
-            respected_rr INTEGER DEFAULT 0,
-            featured INTEGER DEFAULT 0,
-            notes_public TEXT,
-            notes_private TEXT,
-            screenshot_before TEXT,
-            screenshot_after TEXT,
-            rr_ratio REAL,
-            result_r REAL,
-            discipline_score REAL,
-            created_at TEXT,
-            updated_at TEXT
+        CREATE TABLE IF NOT EXISTS trade_stats (
+            status TEXT NOT NULL,
+            result TEXT NOT NULL,
+            trade_count INTEGER NOT NULL DEFAULT 0,
+            sum_r REAL NOT NULL DEFAULT 0,
+            n_r INTEGER NOT NULL DEFAULT 0,
+            sum_discipline REAL NOT NULL DEFAULT 0,
+            n_discipline INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (status, result)
         )
         """
     )
+    rebuild_trade_stats(cur)
+
+    # versi data, naik di setiap write (dipakai cache + ETag, aman lintas worker)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """
+    )
+    cur.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('trades_version', 0)")
+    # migrasi bisa mengubah data -> cache / ETag lama tidak valid
+    bump_trades_version(cur)
+
+    cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
     conn.commit()
     conn.close()
 
 
-init_db()
+def schema_is_current() -> bool:
+    """Cek murah saat start: file db ada dan user_version == SCHEMA_VERSION."""
+    if not DB_PATH.exists():
+        return False
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    finally:
+        conn.close()
+
+
+def rebuild_trade_stats(cur):
+    """
+    Hitung ulang isi trade_stats dari tabel trades. Jalan di init_db, jadi
+    hanya saat migrasi schema atau lewat `flask --app app init-db` -- boot
+    biasa tidak. Jalankan perintah itu untuk membersihkan drift float dari
+    update incremental.
+    """
+    cur.execute("DELETE FROM trade_stats")
+    cur.execute(
+        """
+        INSERT INTO trade_stats (
+            status, result, trade_count,
+            sum_r, n_r, sum_discipline, n_discipline
+        )
+        SELECT
+            COALESCE(status, ''), COALESCE(result, ''), COUNT(*),
+            COALESCE(SUM(result_r), 0), COUNT(result_r),
+            COALESCE(SUM(discipline_score), 0), COUNT(discipline_score)
+        FROM trades
+        GROUP BY COALESCE(status, ''), COALESCE(result, '')
+        """
+    )
+
+
+def bump_trades_version(cur):
+    # panggil di dalam transaksi write yang sama
+    cur.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'trades_version'")
+
+
+def current_trades_version() -> int:
+    """Versi data saat ini, dibaca sekali per request."""
+    if "trades_version" not in g:
+        g.trades_version = (
+            get_db()
+            .execute("SELECT value FROM app_meta WHERE key = 'trades_version'")
+            .fetchone()[0]
+        )
+    return g.trades_version
+
+
+# kolom trades yang berkontribusi ke trade_stats
+STATS_COLUMNS = "status, result, result_r, discipline_score"
+
+
+def apply_trade_stats(cur, trade, sign: int):
+    """
+    Tambahkan (sign=1) atau kurangi (sign=-1) kontribusi satu trade ke trade_stats.
+    `trade` cukup mapping dengan status, result, result_r, discipline_score.
+    """
+    result_r = trade["result_r"]
+    discipline_score = trade["discipline_score"]
+    cur.execute(
+        """
+        INSERT INTO trade_stats (
+            status, result, trade_count,
+            sum_r, n_r, sum_discipline, n_discipline
+        ) VALUES (?,?,?,?,?,?,?)
+        ON CONFLICT (status, result) DO UPDATE SET
+            trade_count = trade_count + excluded.trade_count,
+            sum_r = sum_r + excluded.sum_r,
+            n_r = n_r + excluded.n_r,
+            sum_discipline = sum_discipline + excluded.sum_discipline,
+            n_discipline = n_discipline + excluded.n_discipline
+        """,
+        (
+            trade["status"] or "",
+            trade["result"] or "",
+            sign,
+            sign * (result_r or 0.0),
+            sign if result_r is not None else 0,
+            sign * (discipline_score or 0.0),
+            sign if discipline_score is not None else 0,
+        ),
+    )
+
+
+# worker yang start dengan schema terbaru tidak perlu lock / rebuild apa-apa
+if not schema_is_current():
+    init_db()
+
+
+def _build_id() -> str:
+    """
+    Hash app.py + template: sama di semua worker, berubah tiap deploy.
+    Ikut di ETag supaya HTML dari kode lama tidak dianggap masih valid.
+    """
+    h = hashlib.blake2b(digest_size=6)
+    template_dir = Path(app.root_path) / app.template_folder
+    for path in (Path(__file__), *sorted(template_dir.glob("*.html"))):
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+BUILD_ID = _build_id()
 
 # -----------------------------------------------------------------------------
 # formatting helpers (tampilan angka entry/sl/tp)
 # -----------------------------------------------------------------------------
-def format_price(value):
+_IDN_NUMBER_SWAP = str.maketrans({",": ".", ".": ","})
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_price_cached(value):
     """
     Format angka harga menjadi gaya Indonesia:
     91000      -> 91.000,00
@@ -106,15 +492,32 @@ def format_price(value):
         # kalau bukan angka, tampilkan apa adanya
         return value
 
-    # 91,000.00 -> 91.000,00
-    s = f"{num:,.2f}"
-    s = s.replace(",", "X").replace(".", ",").replace("X", ".")
-    return s
+    # 91,000.00 -> 91.000,00 (tukar , dan . dalam satu pass)
+    return f"{num:,.2f}".translate(_IDN_NUMBER_SWAP)
+
+
+def format_price(value):
+    """
+    Jinja filter `price`. Dipanggil per baris x per kolom harga, dan harga
+    banyak yang berulang, jadi hasilnya di-memoize.
+    """
+    try:
+        return _format_price_cached(value)
+    except TypeError:
+        # value tidak hashable -> format langsung tanpa cache
+        return _format_price_cached.__wrapped__(value)
 
 
 # daftarkan filter ke Jinja
 app.jinja_env.filters["price"] = format_price
 
+# bytecode template di-cache di temp dir (key = hash source), jadi worker yang
+# baru start tidak parse ulang. Halaman utama di-load sekarang supaya request
+# pertama tidak ikut bayar compile. auto_reload sudah off kalau bukan debug.
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+for _template in ("public_index.html", "index.html", "trade_detail.html"):
+    app.jinja_env.get_template(_template)
+
 # -----------------------------------------------------------------------------
 # helpers
 # -----------------------------------------------------------------------------
@@ -124,78 +527,375 @@ def is_logged_in() -> bool:
     return bool(session.get("is_admin"))
 
 
+def _safe_equals(a: str, b: str) -> bool:
+    """Bandingkan string dengan waktu konstan (tidak bocor lewat timing)."""
+    return hmac.compare_digest(a.encode(), b.encode())
+
+
+def check_admin_password(password: str) -> bool:
+    if ADMIN_PASSWORD_HASH:
+        return check_password_hash(ADMIN_PASSWORD_HASH, password)
+    return _safe_equals(password, ADMIN_PASSWORD)
+
+
 def require_login():
     if not is_logged_in():
         return redirect(url_for("login", next=request.path))
     return None
 
 
-def save_upload(file_storage, prefix: str) -> str | None:
+UPLOAD_READ_SIZE = 1 << 20
+
+# nama file upload = hash isi, jadi isi di URL yang sama tidak pernah berubah
+UPLOAD_MAX_AGE = 365 * 24 * 3600
+
+
+def _write_upload(target_path: Path, data: bytes):
+    # tulis ke file sementara lalu rename, supaya tidak pernah ada file setengah jadi
+    tmp_path = target_path.with_name(f".{target_path.name}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, target_path)
+
+
+def _log_upload_failure(target_path: Path, future):
+    # baris trade sudah menunjuk ke file ini, jadi gagal tulis harus kelihatan di log
+    exc = future.exception()
+    if exc is not None:
+        app.logger.error("Gagal menyimpan upload %s", target_path, exc_info=exc)
+
+
+def save_upload(file_storage) -> str | None:
     """
-    Simpan file upload ke static/uploads.
+    Simpan file upload ke static/uploads dengan nama = hash isi file,
+    jadi upload yang sama persis tidak disimpan dua kali.
+    Penulisan ke disk dijalankan di thread pool.
     Return relative path "uploads/xxx.png" atau None.
     """
     if not file_storage or file_storage.filename == "":
         return None
 
-    filename = secure_filename(file_storage.filename)
-    ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    final_name = f"{prefix}_{ts}_{filename}"
+    ext = Path(secure_filename(file_storage.filename)).suffix.lower()
+
+    # stream upload ditutup setelah request selesai, jadi baca isinya sekarang
+    hasher = hashlib.blake2b(digest_size=16)
+    chunks = []
+    # buffer 1 MiB: screenshot biasanya beres dalam 1-2 read
+    for chunk in iter(lambda: file_storage.stream.read(UPLOAD_READ_SIZE), b""):
+        hasher.update(chunk)
+        chunks.append(chunk)
+
+    final_name = f"{hasher.hexdigest()}{ext}"
     target_path = UPLOAD_FOLDER / final_name
-    file_storage.save(target_path)
+    if not target_path.exists():
+        future = _upload_executor.submit(_write_upload, target_path, b"".join(chunks))
+        future.add_done_callback(functools.partial(_log_upload_failure, target_path))
 
     return f"uploads/{final_name}"
 
 
-def compute_rr(entry, sl, tp):
+def normalize_code(value):
+    """
+    Kolom kode (direction/result/status/strategy_tag) disimpan UPPERCASE sekali
+    saat write, supaya read path bisa compare langsung tanpa .upper().
+    "" / None -> None
+    """
+    return (value or "").strip().upper() or None
+
+
+def parse_float(value):
+    """Angka dari form -> float, kosong / bukan angka -> None."""
     try:
-        e = float(entry)
-        s = float(sl)
-        t = float(tp)
+        return float(value)
     except (TypeError, ValueError):
-        return None, None
+        return None
+
 
-    if e == s:
-        return None, None
+# kolom yang dibaca tabel dashboard + equity curve (tanpa notes / screenshot)
+DASHBOARD_FIELDS = (
+    "id",
+    "trade_date",
+    "symbol",
+    "timeframe",
+    "direction",
+    "entry_price",
+    "stop_loss",
+    "take_profit",
+    "status",
+    "result",
+    "result_r",
+    "grade",
+)
+DASHBOARD_COLUMNS = ", ".join(DASHBOARD_FIELDS)
 
-    # risk per unit
-    risk = abs(e - s)
-    reward = abs(t - e)
-    if risk == 0:
-        return None, None
+# baris tabel trade untuk template: Jinja `t.symbol` langsung kena attribute,
+# tidak gagal getattr dulu lalu fallback ke row["symbol"] seperti sqlite3.Row
+TradeRow = namedtuple("TradeRow", DASHBOARD_FIELDS)
 
-    rr = round(reward / risk, 2)
-    return rr, risk
 
+def trade_row_cursor(conn):
+    """Cursor yang return TradeRow, untuk query SELECT {DASHBOARD_COLUMNS}."""
+    cur = conn.cursor()
+    cur.row_factory = lambda _cur, row: TradeRow._make(row)
+    return cur
 
-def compute_result_r(result_value, rr_ratio):
+
+def _summarize_closed(count, wins, sum_r, n_r, sum_disc, n_disc) -> dict:
+    return {
+        "closed_count": count,
+        "win_rate": round(wins / count * 100, 1) if count else 0.0,
+        "avg_r": round(sum_r / n_r, 2) if n_r else 0.0,
+        "discipline_score": round(sum_disc / n_disc, 1) if n_disc else 0.0,
+    }
+
+
+def _build_dashboard_stats(cur) -> dict:
     """
-    Very simple: WIN => +R, LOSE => -1R, BE => 0
+    Snapshot dashboard dari trade_stats (bukan scan semua trades),
+    satu query GROUP BY status untuk semua angka.
+    Return {"public": ..., "admin": ..., "status_counts": {"PLANNED": n, ...}}
+    - public: closed trades yang result-nya WIN / LOSE / BE saja
+    - admin: semua closed trades
     """
-    if rr_ratio is None:
-        return None
+    cur.execute(
+        """
+        SELECT
+            status,
+            SUM(trade_count) AS n,
+            SUM(CASE WHEN result = 'WIN' THEN trade_count ELSE 0 END) AS wins,
+            SUM(sum_r) AS sum_r,
+            SUM(n_r) AS n_r,
+            SUM(sum_discipline) AS sum_disc,
+            SUM(n_discipline) AS n_disc,
+            SUM(CASE WHEN scored THEN trade_count ELSE 0 END) AS scored_n,
+            SUM(CASE WHEN scored THEN sum_r ELSE 0 END) AS scored_sum_r,
+            SUM(CASE WHEN scored THEN n_r ELSE 0 END) AS scored_n_r,
+            SUM(CASE WHEN scored THEN sum_discipline ELSE 0 END) AS scored_sum_disc,
+            SUM(CASE WHEN scored THEN n_discipline ELSE 0 END) AS scored_n_disc
+        FROM (
+            SELECT *, result IN ('WIN', 'LOSE', 'BE') AS scored FROM trade_stats
+        )
+        GROUP BY status
+        """
+    )
+    by_status = {row["status"]: row for row in cur.fetchall()}
+
+    closed = by_status.get("CLOSED")
+    if closed is None:
+        public = admin = _summarize_closed(0, 0, 0.0, 0, 0.0, 0)
+    else:
+        public = _summarize_closed(
+            closed["scored_n"],
+            closed["wins"],
+            closed["scored_sum_r"],
+            closed["scored_n_r"],
+            closed["scored_sum_disc"],
+            closed["scored_n_disc"],
+        )
+        admin = _summarize_closed(
+            closed["n"],
+            closed["wins"],
+            closed["sum_r"],
+            closed["n_r"],
+            closed["sum_disc"],
+            closed["n_disc"],
+        )
+
+    return {
+        "public": public,
+        "admin": admin,
+        "status_counts": {status: row["n"] for status, row in by_status.items()},
+    }
+
+
+def _build_equity_curve(conn):
+    """
+    Data line chart cumulative R dari closed trades (WIN / LOSE / BE),
+    urut kronologis. Return (labels, values).
+    """
+    cur = tuple_cursor(conn)
+    cur.execute(
+        """
+        SELECT trade_date, result_r FROM trades
+        WHERE status = 'CLOSED' AND result IN ('WIN', 'LOSE', 'BE')
+        ORDER BY trade_date ASC, id ASC
+        """
+    )
+    # satu pass: label + cumulative R sekaligus
+    labels = []
+    values = []
+    cum = 0.0
+    for trade_date, result_r in cur:
+        if result_r:
+            cum += result_r
+        labels.append(trade_date)
+        values.append(round(cum, 2))
+    return labels, values
+
+
+def load_dashboard_cached():
+    """
+    Return stats dashboard dari cache kalau masih valid, kalau tidak load ulang.
+    stats = {"public": ..., "admin": ..., "status_counts": ..., "equity_curve": ...}
+    Lock mencegah beberapa thread reload bersamaan saat cache expired.
+    """
+    version = current_trades_version()
+
+    with _dashboard_lock:
+        if (
+            _dashboard_cache["version"] == version
+            and time.monotonic() - _dashboard_cache["ts"] < DASHBOARD_CACHE_TTL
+        ):
+            return _dashboard_cache["stats"]
+
+        conn = get_db()
+        cur = conn.cursor()
+        stats = _build_dashboard_stats(cur)
+        stats["equity_curve"] = _build_equity_curve(conn)
 
-    if result_value == "WIN":
-        return rr_ratio
-    if result_value == "LOSE":
-        return -1.0
-    if result_value == "BE":
-        return 0.0
+        _dashboard_cache.update(
+            version=version,
+            ts=time.monotonic(),
+            stats=stats,
+        )
+        return stats
+
+
+def _data_etag(*extra) -> str:
+    """
+    ETag untuk response yang isinya hanya bergantung pada kode (BUILD_ID),
+    trades_version, + bagian lain yang ikut menentukan isi (mis. mode admin).
+    """
+    parts = (BUILD_ID, current_trades_version(), *extra)
+    return "-".join(str(part) for part in parts)
+
+
+def _not_modified(etag: str, cache_control: str = "private, no-cache"):
+    """Return response 304 kalau If-None-Match cocok, selain itu None."""
+    if request.if_none_match.contains_weak(etag):
+        return _with_cache_headers(Response(status=304), etag, cache_control)
     return None
 
 
-def compute_discipline_score(row: sqlite3.Row):
-    checks = [
-        row["followed_plan"],
-        row["no_revenge"],
-        row["no_fomo"],
-        row["respected_rr"],
-    ]
-    total = len(checks)
-    if total == 0:
+def _with_cache_headers(resp, etag: str, cache_control: str = "private, no-cache"):
+    resp.set_etag(etag, weak=True)
+    # default: browser wajib revalidate (murah, 304) supaya edit owner
+    # langsung kelihatan
+    resp.headers["Cache-Control"] = cache_control
+    return resp
+
+
+def render_cached(key, render):
+    """
+    Ambil HTML dari cache untuk `key`, atau panggil render() lalu simpan.
+    Semua entry dibuang begitu trades_version berubah (write apapun).
+    render() boleh return None (mis. trade tidak ada) -> tidak di-cache.
+    """
+    version = current_trades_version()
+
+    with _page_cache_lock:
+        if _page_cache["version"] != version:
+            _page_cache["version"] = version
+            _page_cache["pages"] = {}
+        html = _page_cache["pages"].get(key)
+
+    if html is None:
+        html = render()
+        if html is not None:
+            with _page_cache_lock:
+                if _page_cache["version"] == version:
+                    pages = _page_cache["pages"]
+                    if len(pages) >= PAGE_CACHE_MAX:
+                        pages.clear()
+                    pages[key] = html
+
+    return html
+
+
+# urutan status di tabel public: planned -> active -> closed
+STATUS_RANK = {"PLANNED": 0, "ACTIVE": 1, "CLOSED": 2}
+
+
+def _get_cursor(prefix: str):
+    """
+    Keyset cursor dari query string: ?{prefix}_date=...&{prefix}_id=...
+    Return (trade_date, id) atau None kalau halaman pertama.
+    """
+    trade_date = request.args.get(f"{prefix}_date", "").strip()
+    trade_id = request.args.get(f"{prefix}_id", type=int)
+    if not trade_date or trade_id is None:
         return None
-    score = sum(1 for c in checks if c) / total * 100
-    return round(score, 1)
+    return trade_date, trade_id
+
+
+def _query_trades(
+    after=None,
+    status=None,
+    direction=None,
+    strategy=None,
+    symbol_query=None,
+):
+    """
+    Satu halaman trade list public, filter + sort di SQL.
+    Urutan: planned -> active -> closed, lalu tanggal naik.
+    `after` = (status_rank, trade_date, id) baris terakhir halaman sebelumnya.
+    Return (rows, has_more).
+
+    Per status satu query `status = ? ... ORDER BY trade_date, id`, jadi
+    tiap query range scan urut di idx_trades_status_date_result (tanpa sort);
+    kalau halaman belum penuh lanjut ke status berikutnya.
+    """
+    where = []
+    params = []
+
+    if direction:
+        where.append("direction = ?")
+        params.append(direction.upper())
+    if strategy:
+        where.append("strategy_tag = ?")
+        params.append(strategy.upper())
+    if symbol_query:
+        escaped = (
+            symbol_query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        )
+        where.append("symbol LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+
+    filter_sql = "".join(f" AND {clause}" for clause in where)
+
+    statuses = list(STATUS_RANK)
+    if status:
+        statuses = [name for name in statuses if name == status.upper()]
+
+    cur = trade_row_cursor(get_db())
+    # ambil satu baris lebih untuk tahu masih ada halaman berikutnya
+    rows = []
+    for status_value in statuses:
+        need = TRADES_PER_PAGE + 1 - len(rows)
+        if need <= 0:
+            break
+
+        rank = STATUS_RANK[status_value]
+        if after and rank < after[0]:
+            continue
+
+        cursor_sql = ""
+        cursor_params = ()
+        if after and rank == after[0]:
+            cursor_sql = " AND (trade_date, id) > (?, ?)"
+            cursor_params = after[1:]
+
+        cur.execute(
+            f"""
+            SELECT {DASHBOARD_COLUMNS} FROM trades
+            WHERE status = ?{cursor_sql}{filter_sql}
+            ORDER BY trade_date ASC, id ASC
+            LIMIT ?
+            """,
+            (status_value, *cursor_params, *params, need),
+        )
+        rows.extend(cur.fetchall())
+
+    return rows[:TRADES_PER_PAGE], len(rows) > TRADES_PER_PAGE
 
 
 # -----------------------------------------------------------------------------
@@ -211,7 +911,11 @@ def login():
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
 
-        if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
+        # cek keduanya tanpa short-circuit supaya waktu respon tidak
+        # membedakan username salah vs password salah
+        username_ok = _safe_equals(username, ADMIN_USERNAME)
+        password_ok = check_admin_password(password)
+        if username_ok and password_ok:
             session["is_admin"] = True
             return redirect(next_url)
 
@@ -237,76 +941,206 @@ def logout():
 
 @app.route("/")
 def public_root():
-    conn = get_db()
-    cur = conn.cursor()
+    is_admin = is_logged_in()
+    etag = _data_etag("public", int(is_admin))
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    filters = {
+        "status": request.args.get("status", "").strip(),
+        "direction": request.args.get("direction", "").strip(),
+        "strategy": request.args.get("strategy", "").strip(),
+        "symbol_query": request.args.get("q", "").strip(),
+    }
+    after = _get_cursor("after")
+    after_status = request.args.get("after_status", "").strip().upper()
+    if after and after_status in STATUS_RANK:
+        after = (STATUS_RANK[after_status], *after)
+    else:
+        after = None
+
+    html = render_cached(
+        ("public", is_admin, after, *filters.values()),
+        lambda: _render_public_root(is_admin, filters, after),
+    )
+    return _with_cache_headers(make_response(html), etag)
 
-    # urut naik supaya equity curve chart kronologis
-    cur.execute("SELECT * FROM trades ORDER BY trade_date ASC, id ASC")
-    trades = cur.fetchall()
-    conn.close()
 
-    # group by status
-    planned = [t for t in trades if t["status"] == "PLANNED"]
-    active = [t for t in trades if t["status"] == "ACTIVE"]
-    closed = [t for t in trades if t["status"] == "CLOSED"]
+def _render_public_root(is_admin: bool, filters: dict, after) -> str:
+    stats = load_dashboard_cached()["public"]
 
-    # stats
-    closed_for_stats = [t for t in closed if t["result"] in ("WIN", "LOSE", "BE")]
-    closed_count = len(closed_for_stats)
-    win_count = sum(1 for t in closed_for_stats if t["result"] == "WIN")
-    win_rate = round(win_count / closed_count * 100, 1) if closed_count else 0.0
+    # tabel: satu halaman saja (keyset), filter + sort di SQLite
+    trades, has_more = _query_trades(after, **filters)
 
-    r_values = [t["result_r"] for t in closed_for_stats if t["result_r"] is not None]
-    avg_r = round(sum(r_values) / len(r_values), 2) if r_values else 0.0
+    return render_template(
+        "public_index.html",
+        is_public=True,
+        is_admin=is_admin,
+        trades=trades,
+        filters=filters,
+        is_first_page=after is None,
+        has_more=has_more,
+        closed_count=stats["closed_count"],
+        win_rate=stats["win_rate"],
+        avg_r=stats["avg_r"],
+        discipline_score=stats["discipline_score"],
+    )
 
-    discipline_scores = [
-        t["discipline_score"] for t in closed_for_stats if t["discipline_score"] is not None
-    ]
-    disc_avg = round(sum(discipline_scores) / len(discipline_scores), 1) if discipline_scores else 0.0
 
-    # data untuk line chart cumulative R
-    chart_labels = []
-    chart_values = []
-    cumulative_r = 0.0
+# data chart sama untuk semua pengunjung (closed trades saja), jadi boleh
+# di-cache shared sebentar
+EQUITY_CURVE_CACHE_CONTROL = "public, max-age=60"
 
-    for t in closed_for_stats:
-        chart_labels.append(t["trade_date"])
-        if t["result_r"] is not None:
-            cumulative_r += t["result_r"]
-        chart_values.append(round(cumulative_r, 2))
 
-    return render_template(
-        "public_index.html",
-        is_public=True,
-        is_admin=is_logged_in(),
-        planned=planned,
-        active=active,
-        closed=closed,
-        closed_count=closed_count,
-        win_rate=win_rate,
-        avg_r=avg_r,
-        discipline_score=disc_avg,
-        chart_labels=chart_labels,
-        chart_values=chart_values,
+@app.route("/api/equity_curve.json")
+def equity_curve_json():
+    """
+    Data equity curve untuk chart di public page, di-fetch dari browser.
+    JSON di-serialize sekali per versi data.
+    """
+    etag = _data_etag("equity")
+    not_modified = _not_modified(etag, EQUITY_CURVE_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+
+    def render():
+        labels, values = load_dashboard_cached()["equity_curve"]
+        return json.dumps({"labels": labels, "values": values})
+
+    body = render_cached(("equity_json",), render)
+    resp = Response(body, mimetype="application/json")
+    return _with_cache_headers(resp, etag, EQUITY_CURVE_CACHE_CONTROL)
+
+
+# kolom yang aman untuk publik (tanpa notes_private / screenshot)
+EXPORT_COLUMNS = (
+    "trade_date",
+    "symbol",
+    "timeframe",
+    "direction",
+    "entry_price",
+    "stop_loss",
+    "take_profit",
+    "risk_percent",
+    "result",
+    "grade",
+    "strategy_tag",
+    "status",
+    "rr_ratio",
+    "result_r",
+    "discipline_score",
+)
+
+
+@app.route("/public/export/csv")
+def export_closed_csv():
+    """
+    Export closed trades ke CSV, di-stream per baris supaya memory konstan.
+    Hanya yang result-nya WIN / LOSE / BE, sama dengan stats public dan
+    equity curve.
+    """
+    etag = _data_etag("csv")
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    # download lambat bisa lama; jangan tahan slot pool sampai byte terakhir.
+    # koneksi pool dikembalikan sekarang, stream pakai koneksi sendiri.
+    release_db()
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+
+        writer.writerow(EXPORT_COLUMNS)
+        yield buf.getvalue()
+
+        conn = connect_db()
+        try:
+            cur = tuple_cursor(conn)
+            cur.execute(
+                f"""
+                SELECT {", ".join(EXPORT_COLUMNS)}
+                FROM trades
+                WHERE status = 'CLOSED' AND result IN ('WIN', 'LOSE', 'BE')
+                ORDER BY trade_date ASC, id ASC
+                """
+            )
+            for row in cur:
+                buf.seek(0)
+                buf.truncate(0)
+                writer.writerow(row)
+                yield buf.getvalue()
+        finally:
+            conn.close()
+
+    resp = Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=trades_closed.csv"},
+    )
+    return _with_cache_headers(resp, etag)
+
+
+# kolom yang dipakai trade_detail.html (notes_private hanya untuk owner)
+DETAIL_COLUMNS = ", ".join(
+    (
+        "id",
+        "trade_date",
+        "symbol",
+        "timeframe",
+        "direction",
+        "entry_price",
+        "stop_loss",
+        "take_profit",
+        "risk_percent",
+        "result",
+        "result_r",
+        "discipline_score",
+        "featured",
+        "notes_public",
+        "screenshot_before",
+        "screenshot_after",
     )
+)
 
 
 @app.route("/trade/<int:trade_id>")
 def trade_detail(trade_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM trades WHERE id = ?", (trade_id,))
-    trade = cur.fetchone()
-    conn.close()
+    is_admin = is_logged_in()
+    etag = _data_etag("trade", trade_id, int(is_admin))
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    html = render_cached(
+        ("trade", trade_id, is_admin),
+        lambda: _render_trade_detail(trade_id, is_admin),
+    )
+    if html is None:
+        return redirect(url_for("public_root"))
+
+    return _with_cache_headers(make_response(html), etag)
+
+
+def _render_trade_detail(trade_id: int, is_admin: bool) -> str | None:
+    columns = f"{DETAIL_COLUMNS}, notes_private" if is_admin else DETAIL_COLUMNS
+
+    trade = (
+        get_db()
+        .execute(f"SELECT {columns} FROM trades WHERE id = ?", (trade_id,))
+        .fetchone()
+    )
 
     if not trade:
-        return redirect(url_for("public_root"))
+        return None
 
     return render_template(
         "trade_detail.html",
         trade=trade,
         is_public=True,
-        is_admin=is_logged_in(),
+        is_admin=is_admin,
     )
 
 
@@ -321,145 +1155,157 @@ def admin_dashboard():
     if maybe_redirect:
         return maybe_redirect
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM trades ORDER BY trade_date DESC, id DESC")
-    trades = cur.fetchall()
-
-    # stats for closed trades only
-    closed_for_stats = [t for t in trades if t["status"] == "CLOSED"]
-    closed_count = len(closed_for_stats)
-    win_count = sum(1 for t in closed_for_stats if t["result"] == "WIN")
-    win_rate = round(win_count / closed_count * 100, 1) if closed_count else 0.0
-
-    r_values = [t["result_r"] for t in closed_for_stats if t["result_r"] is not None]
-    avg_r = round(sum(r_values) / len(r_values), 2) if r_values else 0.0
-
-    discipline_scores = [
-        t["discipline_score"]
-        for t in closed_for_stats
-        if t["discipline_score"] is not None
-    ]
-    disc_avg = round(sum(discipline_scores) / len(discipline_scores), 1) if discipline_scores else 0.0
-
-    # status counts
-    planned_count = sum(1 for t in trades if t["status"] == "PLANNED")
-    active_count = sum(1 for t in trades if t["status"] == "ACTIVE")
-
-    conn.close()
+    all_stats = load_dashboard_cached()
+    status_counts = all_stats["status_counts"]
+
+    # keyset: lanjut dari (trade_date, id) baris terakhir, pakai idx_trades_date_id
+    before = _get_cursor("before")
+    where_sql = "WHERE (trade_date, id) < (?, ?)" if before else ""
+
+    trades = (
+        trade_row_cursor(get_db())
+        .execute(
+            f"""
+            SELECT {DASHBOARD_COLUMNS} FROM trades
+            {where_sql}
+            ORDER BY trade_date DESC, id DESC
+            LIMIT ?
+            """,
+            (*(before or ()), TRADES_PER_PAGE + 1),
+        )
+        .fetchall()
+    )
+    has_more = len(trades) > TRADES_PER_PAGE
 
     return render_template(
         "index.html",
-        trades=trades,
+        trades=trades[:TRADES_PER_PAGE],
+        is_first_page=before is None,
+        has_more=has_more,
         is_public=False,
         is_admin=True,
-        planned_count=planned_count,
-        active_count=active_count,
-        closed_count=closed_count,
-        win_rate=win_rate,
-        avg_r=avg_r,
-        discipline_score=disc_avg,
+        planned_count=status_counts.get("PLANNED", 0),
+        active_count=status_counts.get("ACTIVE", 0),
+        **all_stats["admin"],
     )
 
 
+# SQL tulis dibuat sekali di module level; string yang sama -> statement cache
+# sqlite3 tidak perlu parse ulang tiap request
+INSERT_TRADE_SQL = """
+    INSERT INTO trades (
+        trade_date, symbol, timeframe, direction,
+        entry_price, stop_loss, take_profit,
+        risk_percent, result, grade,
+        strategy_tag, market_condition, status,
+        followed_plan, no_revenge, no_fomo, respected_rr,
+        featured, notes_public, notes_private,
+        screenshot_before, screenshot_after,
+        created_at, updated_at
+    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+UPDATE_TRADE_SQL = """
+    UPDATE trades
+    SET trade_date=?, symbol=?, timeframe=?, direction=?,
+        entry_price=?, stop_loss=?, take_profit=?,
+        risk_percent=?, result=?, grade=?,
+        strategy_tag=?, market_condition=?, status=?,
+        followed_plan=?, no_revenge=?, no_fomo=?, respected_rr=?,
+        featured=?, notes_public=?, notes_private=?,
+        screenshot_before=?, screenshot_after=?,
+        updated_at=?
+    WHERE id=?
+"""
+
+UPDATE_SCREENSHOTS_SQL = """
+    UPDATE trades
+    SET screenshot_before=?, screenshot_after=?, updated_at=?
+    WHERE id=?
+"""
+
+
+def _form_text(value):
+    return value
+
+
+def _form_upper(value):
+    return (value or "").upper()
+
+
+def _form_flag(value):
+    # checkbox: ada di form -> 1, tidak ada -> 0
+    return 1 if value else 0
+
+
+def _form_status(value):
+    return normalize_code(value) or "PLANNED"
+
+
+# field form trade + cara parse-nya, urut sama dengan kolom INSERT / UPDATE
+TRADE_FORM_FIELDS = (
+    ("trade_date", _form_text),
+    ("symbol", _form_upper),
+    ("timeframe", _form_text),
+    ("direction", normalize_code),
+    ("entry_price", parse_float),
+    ("stop_loss", parse_float),
+    ("take_profit", parse_float),
+    ("risk_percent", parse_float),
+    ("result", normalize_code),
+    ("grade", _form_text),
+    ("strategy_tag", normalize_code),
+    ("market_condition", _form_text),
+    ("status", _form_status),
+    ("followed_plan", _form_flag),
+    ("no_revenge", _form_flag),
+    ("no_fomo", _form_flag),
+    ("respected_rr", _form_flag),
+    ("featured", _form_flag),
+    ("notes_public", _form_text),
+    ("notes_private", _form_text),
+)
+
+
+def parse_trade_form(form, default_date) -> dict:
+    """Field form new / edit trade -> dict, urut sesuai TRADE_FORM_FIELDS."""
+    values = {name: parse(form.get(name)) for name, parse in TRADE_FORM_FIELDS}
+    values["trade_date"] = values["trade_date"] or default_date
+    return values
+
+
+def _same_field(new, old) -> bool:
+    # input text kosong dikirim "" sementara kolomnya bisa NULL
+    return new == old or (new in (None, "") and old in (None, ""))
+
+
 @app.route("/admin/new", methods=["GET", "POST"])
 def new_trade():
     maybe_redirect = require_login()
     if maybe_redirect:
         return maybe_redirect
 
-    today = datetime.utcnow().strftime("%Y-%m-%d")
+    # satu kali baca jam per request, dipakai default tanggal + created/updated_at
+    now = datetime.utcnow()
+    today = f"{now:%Y-%m-%d}"
 
     if request.method == "POST":
-        form = request.form
-
-        trade_date = form.get("trade_date") or today
-        symbol = form.get("symbol", "").upper()
-        timeframe = form.get("timeframe")
-        direction = form.get("direction")
-        entry_price = form.get("entry_price")
-        stop_loss = form.get("stop_loss")
-        take_profit = form.get("take_profit")
-        risk_percent = form.get("risk_percent")
-        result = form.get("result")
-        grade = form.get("grade")
-        strategy_tag = form.get("strategy_tag")
-        market_condition = form.get("market_condition")
-        status = form.get("status", "PLANNED")
-
-        followed_plan = 1 if form.get("followed_plan") else 0
-        no_revenge = 1 if form.get("no_revenge") else 0
-        no_fomo = 1 if form.get("no_fomo") else 0
-        respected_rr = 1 if form.get("respected_rr") else 0
-        featured = 1 if form.get("featured") else 0
-
-        notes_public = form.get("notes_public")
-        notes_private = form.get("notes_private")
-
         before_file = request.files.get("screenshot_before")
         after_file = request.files.get("screenshot_after")
 
-        screenshot_before = save_upload(before_file, "before") if before_file else None
-        screenshot_after = save_upload(after_file, "after") if after_file else None
-
-        rr_ratio, _ = compute_rr(entry_price, stop_loss, take_profit)
-        result_r = compute_result_r(result, rr_ratio)
-
-        discipline_score = None
-        checks = [followed_plan, no_revenge, no_fomo, respected_rr]
-        if any(checks):
-            discipline_score = round(sum(checks) / len(checks) * 100, 1)
+        values = parse_trade_form(request.form, today)
+        values["screenshot_before"] = save_upload(before_file) if before_file else None
+        values["screenshot_after"] = save_upload(after_file) if after_file else None
+        now_iso = now.isoformat(timespec="seconds")
 
-        now_iso = datetime.utcnow().isoformat()
-
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO trades (
-                trade_date, symbol, timeframe, direction,
-                entry_price, stop_loss, take_profit,
-                risk_percent, result, grade,
-                strategy_tag, market_condition, status,
-                followed_plan, no_revenge, no_fomo, respected_rr,
-                featured, notes_public, notes_private,
-                screenshot_before, screenshot_after,
-                rr_ratio, result_r, discipline_score,
-                created_at, updated_at
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-            (
-                trade_date,
-                symbol,
-                timeframe,
-                direction,
-                entry_price or None,
-                stop_loss or None,
-                take_profit or None,
-                risk_percent or None,
-                result,
-                grade,
-                strategy_tag,
-                market_condition,
-                status,
-                followed_plan,
-                no_revenge,
-                no_fomo,
-                respected_rr,
-                featured,
-                notes_public,
-                notes_private,
-                screenshot_before,
-                screenshot_after,
-                rr_ratio,
-                result_r,
-                discipline_score,
-                now_iso,
-                now_iso,
-            ),
-        )
-        conn.commit()
-        conn.close()
+        with write_transaction(get_db()) as cur:
+            cur.execute(INSERT_TRADE_SQL, (*values.values(), now_iso, now_iso))
+            # result_r / discipline_score baru dihitung SQLite saat INSERT
+            cur.execute(
+                f"SELECT {STATS_COLUMNS} FROM trades WHERE id = ?", (cur.lastrowid,)
+            )
+            apply_trade_stats(cur, cur.fetchone(), 1)
+            bump_trades_version(cur)
 
         return redirect(url_for("admin_dashboard"))
 
@@ -483,35 +1329,9 @@ def edit_trade(trade_id: int):
     trade = cur.fetchone()
 
     if not trade:
-        conn.close()
         return redirect(url_for("admin_dashboard"))
 
     if request.method == "POST":
-        form = request.form
-
-        trade_date = form.get("trade_date") or trade["trade_date"]
-        symbol = form.get("symbol", "").upper()
-        timeframe = form.get("timeframe")
-        direction = form.get("direction")
-        entry_price = form.get("entry_price")
-        stop_loss = form.get("stop_loss")
-        take_profit = form.get("take_profit")
-        risk_percent = form.get("risk_percent")
-        result = form.get("result")
-        grade = form.get("grade")
-        strategy_tag = form.get("strategy_tag")
-        market_condition = form.get("market_condition")
-        status = form.get("status", "PLANNED")
-
-        followed_plan = 1 if form.get("followed_plan") else 0
-        no_revenge = 1 if form.get("no_revenge") else 0
-        no_fomo = 1 if form.get("no_fomo") else 0
-        respected_rr = 1 if form.get("respected_rr") else 0
-        featured = 1 if form.get("featured") else 0
-
-        notes_public = form.get("notes_public")
-        notes_private = form.get("notes_private")
-
         before_file = request.files.get("screenshot_before")
         after_file = request.files.get("screenshot_after")
 
@@ -519,71 +1339,44 @@ def edit_trade(trade_id: int):
         screenshot_after = trade["screenshot_after"]
 
         if before_file and before_file.filename:
-            screenshot_before = save_upload(before_file, "before")
+            screenshot_before = save_upload(before_file)
 
         if after_file and after_file.filename:
-            screenshot_after = save_upload(after_file, "after")
-
-        rr_ratio, _ = compute_rr(entry_price, stop_loss, take_profit)
-        result_r = compute_result_r(result, rr_ratio)
-
-        discipline_score = None
-        checks = [followed_plan, no_revenge, no_fomo, respected_rr]
-        if any(checks):
-            discipline_score = round(sum(checks) / len(checks) * 100, 1)
-
-        now_iso = datetime.utcnow().isoformat()
-
-        cur.execute(
-            """
-            UPDATE trades
-            SET trade_date=?, symbol=?, timeframe=?, direction=?,
-                entry_price=?, stop_loss=?, take_profit=?,
-                risk_percent=?, result=?, grade=?,
-                strategy_tag=?, market_condition=?, status=?,
-                followed_plan=?, no_revenge=?, no_fomo=?, respected_rr=?,
-                featured=?, notes_public=?, notes_private=?,
-                screenshot_before=?, screenshot_after=?,
-                rr_ratio=?, result_r=?, discipline_score=?,
-                updated_at=?
-            WHERE id=?
-            """,
-            (
-                trade_date,
-                symbol,
-                timeframe,
-                direction,
-                entry_price or None,
-                stop_loss or None,
-                take_profit or None,
-                risk_percent or None,
-                result,
-                grade,
-                strategy_tag,
-                market_condition,
-                status,
-                followed_plan,
-                no_revenge,
-                no_fomo,
-                respected_rr,
-                featured,
-                notes_public,
-                notes_private,
-                screenshot_before,
-                screenshot_after,
-                rr_ratio,
-                result_r,
-                discipline_score,
-                now_iso,
-                trade_id,
-            ),
-        )
-        conn.commit()
-        conn.close()
+            screenshot_after = save_upload(after_file)
+
+        values = parse_trade_form(request.form, trade["trade_date"])
+        now_iso = datetime.utcnow().isoformat(timespec="seconds")
+
+        # fast path: semua field form sama dengan baris lama (mis. cuma ganti
+        # screenshot) -> tidak perlu tulis ulang semua kolom / sentuh trade_stats
+        if all(_same_field(values[name], trade[name]) for name, _ in TRADE_FORM_FIELDS):
+            with write_transaction(conn) as cur:
+                cur.execute(
+                    UPDATE_SCREENSHOTS_SQL,
+                    (screenshot_before, screenshot_after, now_iso, trade_id),
+                )
+                if cur.rowcount:
+                    bump_trades_version(cur)
+            return redirect(url_for("admin_dashboard"))
+
+        values["screenshot_before"] = screenshot_before
+        values["screenshot_after"] = screenshot_after
+
+        # lock writer dulu, baru baca baris lama untuk delta trade_stats
+        with write_transaction(conn) as cur:
+            cur.execute(f"SELECT {STATS_COLUMNS} FROM trades WHERE id = ?", (trade_id,))
+            old_trade = cur.fetchone()
+            if old_trade is None:
+                return redirect(url_for("admin_dashboard"))
+
+            cur.execute(UPDATE_TRADE_SQL, (*values.values(), now_iso, trade_id))
+            apply_trade_stats(cur, old_trade, -1)
+            cur.execute(f"SELECT {STATS_COLUMNS} FROM trades WHERE id = ?", (trade_id,))
+            apply_trade_stats(cur, cur.fetchone(), 1)
+            bump_trades_version(cur)
 
         return redirect(url_for("admin_dashboard"))
 
-    conn.close()
     return render_template(
         "edit_trade.html",
         trade=trade,
@@ -598,11 +1391,14 @@ def delete_trade(trade_id: int):
     if maybe_redirect:
         return maybe_redirect
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM trades WHERE id = ?", (trade_id,))
-    conn.commit()
-    conn.close()
+    with write_transaction(get_db()) as cur:
+        cur.execute(f"SELECT {STATS_COLUMNS} FROM trades WHERE id = ?", (trade_id,))
+        trade = cur.fetchone()
+
+        if trade:
+            cur.execute("DELETE FROM trades WHERE id = ?", (trade_id,))
+            apply_trade_stats(cur, trade, -1)
+            bump_trades_version(cur)
 
     return redirect(url_for("admin_dashboard"))
 
@@ -614,7 +1410,27 @@ def delete_trade(trade_id: int):
 
 @app.route("/uploads/<path:filename>")
 def uploaded_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    resp = send_from_directory(
+        app.config["UPLOAD_FOLDER"],
+        filename,
+        conditional=True,
+        etag=True,
+        max_age=UPLOAD_MAX_AGE,
+    )
+    resp.cache_control.immutable = True
+    return resp
+
+
+# -----------------------------------------------------------------------------
+# cli (flask --app app <command>)
+# -----------------------------------------------------------------------------
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create or migrate the database schema."""
+    init_db()
+    click.echo(f"Database ready at {DB_PATH} (schema v{SCHEMA_VERSION}).")
 
 
 # -----------------------------------------------------------------------------